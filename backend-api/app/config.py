@@ -34,6 +34,19 @@ class Settings(BaseSettings):
     DB_RETRY_MIN_SECONDS: int = int(os.getenv("DB_RETRY_MIN_SECONDS", "4"))
     DB_RETRY_MAX_SECONDS: int = int(os.getenv("DB_RETRY_MAX_SECONDS", "10"))
     
+    # Request deadline settings (seconds)
+    REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "10"))
+    INSIGHTS_TIMEOUT_SECONDS: float = float(os.getenv("INSIGHTS_TIMEOUT_SECONDS", "30"))
+    REQUEST_TIMEOUT_MAX_SECONDS: float = float(os.getenv("REQUEST_TIMEOUT_MAX_SECONDS", "60"))
+    DEADLINE_MIN_ATTEMPT_SECONDS: float = float(os.getenv("DEADLINE_MIN_ATTEMPT_SECONDS", "0.5"))
+    AI_TIMEOUT_SECONDS: float = float(os.getenv("AI_TIMEOUT_SECONDS", "60"))
+    
+    # Change feed settings
+    CHANGE_FEED_QUEUE_SIZE: int = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "100"))
+    CHANGE_FEED_HEARTBEAT_SECONDS: int = int(os.getenv("CHANGE_FEED_HEARTBEAT_SECONDS", "15"))
+    CHANGE_FEED_RECONNECT_SECONDS: int = int(os.getenv("CHANGE_FEED_RECONNECT_SECONDS", "5"))
+    CHANGE_FEED_CONNECT_TIMEOUT_SECONDS: int = int(os.getenv("CHANGE_FEED_CONNECT_TIMEOUT_SECONDS", "5"))
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
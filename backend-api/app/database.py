@@ -7,6 +7,7 @@ from contextlib import contextmanager
 import logging
 
 from app.config import settings
+from app.deadline import stop_at_deadline, wait_for_deadline
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,9 +16,14 @@ logger = logging.getLogger(__name__)
 # Global connection pool
 connection_pool = None
 
+# Advisory lock key serializing schema setup across workers
+SCHEMA_LOCK_KEY = 726351
+
 @retry(
-    stop=stop_after_attempt(settings.DB_RETRY_ATTEMPTS),
-    wait=wait_exponential(multiplier=1, min=settings.DB_RETRY_MIN_SECONDS, max=settings.DB_RETRY_MAX_SECONDS),
+    stop=stop_after_attempt(settings.DB_RETRY_ATTEMPTS) | stop_at_deadline(),
+    wait=wait_for_deadline(
+        wait_exponential(multiplier=1, min=settings.DB_RETRY_MIN_SECONDS, max=settings.DB_RETRY_MAX_SECONDS)
+    ),
     reraise=True
 )
 def create_connection_pool():
@@ -57,18 +63,85 @@ def get_db():
         if conn:
             connection_pool.putconn(conn)
 
+def _has_legacy_department_column(cursor) -> bool:
+    """Check whether the attendance table still stores department names inline"""
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'attendance' AND column_name = 'department'
+        """
+    )
+    return cursor.fetchone() is not None
+
+def _migrate_legacy_attendance(cursor):
+    """
+    Migrate attendance rows from repeated department/status strings to the
+    departments table and the attendance_status enum
+    """
+    logger.info("Migrating attendance table to normalized department and status columns...")
+    cursor.execute('''INSERT INTO departments (name)
+        SELECT DISTINCT department FROM attendance
+        ON CONFLICT (name) DO NOTHING''')
+    cursor.execute("ALTER TABLE attendance ADD COLUMN department_id INTEGER REFERENCES departments(id)")
+    cursor.execute('''UPDATE attendance a SET department_id = d.id
+        FROM departments d WHERE d.name = a.department''')
+    cursor.execute("ALTER TABLE attendance ALTER COLUMN department_id SET NOT NULL")
+    cursor.execute("ALTER TABLE attendance DROP COLUMN department")
+    cursor.execute("ALTER TABLE attendance DROP CONSTRAINT IF EXISTS attendance_status_check")
+    # Changing the column type rewrites the table, which also reclaims the
+    # space still held by the dropped department column
+    cursor.execute('''ALTER TABLE attendance
+        ALTER COLUMN status TYPE attendance_status USING status::attendance_status''')
+    logger.info("Attendance table migration complete")
+
+def _widen_department_keys(cursor):
+    """
+    Widen SMALLINT department keys created by earlier versions to INTEGER
+
+    Sequence values are consumed by upsert conflicts and rolled back inserts,
+    so a SMALLINT key can run out long before there are 32767 departments.
+    """
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'departments'
+            AND column_name = 'id' AND data_type = 'smallint'
+        """
+    )
+    if cursor.fetchone() is None:
+        return
+    logger.info("Widening department keys to INTEGER...")
+    cursor.execute("ALTER TABLE attendance ALTER COLUMN department_id TYPE INTEGER")
+    cursor.execute("ALTER TABLE departments ALTER COLUMN id TYPE INTEGER")
+    cursor.execute("ALTER SEQUENCE departments_id_seq AS INTEGER")
+
 def initialize_db():
     """Initialize database schema"""
     with get_db() as conn:
         try:
             cursor = conn.cursor()
+            # Workers start concurrently; only one may create or migrate the schema at a time.
+            # The legacy column check below runs after the lock, so later workers skip the migration.
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_KEY,))
+            cursor.execute('''DO $$ BEGIN
+                CREATE TYPE attendance_status AS ENUM ('Present', 'Absent', 'WFH');
+            EXCEPTION
+                WHEN duplicate_object THEN NULL;
+            END $$''')
+            cursor.execute('''CREATE TABLE IF NOT EXISTS departments (
+                id SERIAL PRIMARY KEY,
+                name VARCHAR(50) NOT NULL UNIQUE
+            )''')
             cursor.execute('''CREATE TABLE IF NOT EXISTS attendance (
                 id SERIAL PRIMARY KEY,
                 employee_id INT NOT NULL,
                 date DATE NOT NULL,
-                status VARCHAR(10) NOT NULL CHECK (status IN ('Present', 'Absent', 'WFH')),
-                department VARCHAR(50) NOT NULL
+                status attendance_status NOT NULL,
+                department_id INTEGER NOT NULL REFERENCES departments(id)
             )''')
+            if _has_legacy_department_column(cursor):
+                _migrate_legacy_attendance(cursor)
+            _widen_department_keys(cursor)
             conn.commit()
             logger.info("Database initialized successfully")
         except Exception as e:
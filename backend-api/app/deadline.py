@@ -0,0 +1,156 @@
+# app/deadline.py
+import math
+import time
+import logging
+from contextvars import ContextVar
+from typing import Optional, Set
+from fastapi import HTTPException
+from tenacity.stop import stop_base
+from tenacity.wait import wait_base
+
+from app.config import settings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class DeadlineExceeded(HTTPException):
+    """Raised when a request runs out of time budget or its client has gone away"""
+
+    def __init__(self, detail: str = "Request deadline exceeded"):
+        super().__init__(status_code=504, detail=detail)
+
+class Deadline:
+    """Time budget for a single request, shared by all DB and AI operations it performs"""
+
+    def __init__(self, timeout: float):
+        self.expires_at = time.monotonic() + timeout
+        self.cancelled = False
+        self._connections: Set = set()
+
+    def remaining(self) -> float:
+        """Seconds left in the budget, or 0 if expired or cancelled"""
+        if self.cancelled:
+            return 0.0
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def check(self) -> None:
+        """Raise DeadlineExceeded if no budget is left"""
+        if self.cancelled:
+            raise DeadlineExceeded("Request cancelled by client")
+        if self.remaining() <= 0:
+            raise DeadlineExceeded()
+
+    def track(self, conn) -> None:
+        """Remember a connection running work for this request so it can be cancelled"""
+        self._connections.add(conn)
+
+    def cancel(self) -> None:
+        """Stop further work and cancel any in-flight PostgreSQL statements"""
+        self.cancelled = True
+        for conn in list(self._connections):
+            try:
+                conn.cancel()
+            except Exception as e:
+                logger.warning(f"Failed to cancel database statement: {str(e)}")
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+def get_deadline() -> Optional[Deadline]:
+    """Get the deadline of the current request, if any"""
+    return _current_deadline.get()
+
+def set_deadline(deadline: Optional[Deadline]):
+    """Set the deadline of the current request; returns a token for reset_deadline"""
+    return _current_deadline.set(deadline)
+
+def reset_deadline(token) -> None:
+    """Restore the deadline that was current before set_deadline"""
+    _current_deadline.reset(token)
+
+def parse_request_timeout(header: Optional[str], default: float) -> float:
+    """
+    Work out a request's time budget from its X-Request-Timeout header
+
+    Args:
+        header: X-Request-Timeout header value in seconds, if sent
+        default: Route default budget in seconds
+
+    Returns:
+        Budget in seconds, capped at REQUEST_TIMEOUT_MAX_SECONDS
+
+    Raises:
+        ValueError: If the header is not a positive, finite number
+    """
+    if header is None:
+        return default
+    try:
+        requested = float(header)
+    except ValueError:
+        raise ValueError("X-Request-Timeout must be a number of seconds")
+    if not math.isfinite(requested) or requested <= 0:
+        raise ValueError("X-Request-Timeout must be a positive, finite number")
+    return min(requested, settings.REQUEST_TIMEOUT_MAX_SECONDS)
+
+def get_timeout(default: float) -> float:
+    """
+    Timeout to use for a blocking call made on behalf of the current request
+
+    Args:
+        default: Timeout used outside of a request
+
+    Returns:
+        Remaining budget in seconds, or default if there is no deadline
+
+    Raises:
+        DeadlineExceeded: If the budget is already spent
+    """
+    deadline = get_deadline()
+    if deadline is None:
+        return default
+    deadline.check()
+    return deadline.remaining()
+
+def apply_statement_timeout(conn) -> None:
+    """
+    Limit the next statement to the remaining request budget
+
+    statement_timeout applies to each statement separately, so this must be
+    called again before every statement of a multi-statement operation for the
+    whole operation to stay within the deadline.
+
+    Args:
+        conn: Database connection
+
+    Raises:
+        DeadlineExceeded: If the budget is already spent
+    """
+    deadline = get_deadline()
+    if deadline is None:
+        return
+    deadline.check()
+    deadline.track(conn)
+    timeout_ms = max(int(deadline.remaining() * 1000), 1)
+    cursor = conn.cursor()
+    cursor.execute("SELECT set_config('statement_timeout', %s, true)", (str(timeout_ms),))
+
+class stop_at_deadline(stop_base):
+    """Stop retrying once the request no longer has budget for another attempt"""
+
+    def __call__(self, retry_state) -> bool:
+        deadline = get_deadline()
+        if deadline is None:
+            return False
+        return deadline.remaining() < settings.DEADLINE_MIN_ATTEMPT_SECONDS
+
+class wait_for_deadline(wait_base):
+    """Trim a backoff so that the next attempt still fits in the request budget"""
+
+    def __init__(self, wait: wait_base):
+        self.wait = wait
+
+    def __call__(self, retry_state) -> float:
+        delay = self.wait(retry_state)
+        deadline = get_deadline()
+        if deadline is None:
+            return delay
+        return max(min(delay, deadline.remaining() - settings.DEADLINE_MIN_ATTEMPT_SECONDS), 0.0)
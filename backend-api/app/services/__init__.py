@@ -1,3 +1,4 @@
 # app/services/__init__.py
+from app.services import change_feed
 from app.services import attendance_service
 from app.services import ai_service
\ No newline at end of file
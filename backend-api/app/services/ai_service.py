@@ -3,19 +3,22 @@ import anthropic
 import openai
 from google import genai
 import logging
+import httpx
+import psycopg2.errors
 from fastapi import HTTPException
 from typing import List, Dict, Any, Optional
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
 from app.config import settings
+from app.deadline import DeadlineExceeded, apply_statement_timeout, get_timeout, stop_at_deadline, wait_for_deadline
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Define retry decorator for AI API calls
 ai_retry = retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=1, max=10),
+    stop=stop_after_attempt(3) | stop_at_deadline(),
+    wait=wait_for_deadline(wait_exponential(multiplier=1, min=1, max=10)),
     reraise=True
 )
 
@@ -29,9 +32,14 @@ def _get_attendance_data(conn) -> str:
     Returns:
         Formatted attendance data as a string
     """
+    apply_statement_timeout(conn)
     cursor = conn.cursor()
     cursor.execute(
-        "SELECT employee_id, date, status, department FROM attendance ORDER BY date DESC"
+        """
+        SELECT a.employee_id, a.date, a.status, d.name AS department
+        FROM attendance a JOIN departments d ON d.id = a.department_id
+        ORDER BY a.date DESC
+        """
     )
     records = cursor.fetchall()
     
@@ -44,8 +52,10 @@ def _get_attendance_data(conn) -> str:
 @ai_retry
 def _get_claude_insights(text_data: str, user_query: str) -> str:
     """Generate insights using Claude AI"""
+    timeout = get_timeout(settings.AI_TIMEOUT_SECONDS)
     try:
-        client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+        # ai_retry is the only retry layer, so every attempt fits the request deadline
+        client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY, timeout=timeout, max_retries=0)
         response = client.messages.create(
             model="claude-3.7-sonnet-2024-03-25",
             max_tokens=1000,
@@ -55,6 +65,9 @@ def _get_claude_insights(text_data: str, user_query: str) -> str:
             ]
         )
         return response.content[0].text
+    except anthropic.APITimeoutError:
+        logger.warning("Claude request timed out at the request deadline")
+        raise DeadlineExceeded()
     except anthropic.APIError as e:
         logger.error(f"Claude API error: {str(e)}")
         raise HTTPException(status_code=502, detail=f"Claude AI service unavailable: {str(e)}")
@@ -65,8 +78,10 @@ def _get_claude_insights(text_data: str, user_query: str) -> str:
 @ai_retry
 def _get_openai_insights(text_data: str, user_query: str) -> str:
     """Generate insights using OpenAI"""
+    timeout = get_timeout(settings.AI_TIMEOUT_SECONDS)
     try:
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        # ai_retry is the only retry layer, so every attempt fits the request deadline
+        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY, timeout=timeout, max_retries=0)
         response = client.chat.completions.create(
             model="gpt-4o",
             messages=[
@@ -75,6 +90,9 @@ def _get_openai_insights(text_data: str, user_query: str) -> str:
             ]
         )
         return response.choices[0].message.content
+    except openai.APITimeoutError:
+        logger.warning("OpenAI request timed out at the request deadline")
+        raise DeadlineExceeded()
     except openai.APIError as e:
         logger.error(f"OpenAI API error: {str(e)}")
         raise HTTPException(status_code=502, detail=f"OpenAI service unavailable: {str(e)}")
@@ -85,14 +103,20 @@ def _get_openai_insights(text_data: str, user_query: str) -> str:
 @ai_retry
 def _get_gemini_insights(text_data: str, user_query: str) -> str:
     """Generate insights using Gemini AI"""
+    timeout = get_timeout(settings.AI_TIMEOUT_SECONDS)
     try:
         genai.configure(api_key=settings.GEMINI_API_KEY)
-        client = genai.Client()
+        # Gemini HTTP timeouts are given in milliseconds. No retry_options are set,
+        # so the client makes a single attempt and ai_retry stays the only retry layer.
+        client = genai.Client(http_options={"timeout": int(timeout * 1000)})
         response = client.models.generate_content(
             model="gemini-2.0-flash", 
             contents=f"Data:\n{text_data}\n\nQuestion: {user_query}"
         )
         return response.text
+    except httpx.TimeoutException:
+        logger.warning("Gemini request timed out at the request deadline")
+        raise DeadlineExceeded()
     except Exception as e:
         logger.error(f"Error generating Gemini insights: {str(e)}")
         raise HTTPException(status_code=502, detail=f"Gemini AI service unavailable: {str(e)}")
@@ -108,6 +132,7 @@ def generate_insights(conn, user_query: Optional[str] = None) -> str:
     Returns:
         Insights text generated by AI
     """
+    apply_statement_timeout(conn)
     try:
         # Check if there's any data
         cursor = conn.cursor()
@@ -135,13 +160,19 @@ def generate_insights(conn, user_query: Optional[str] = None) -> str:
             else:  # Default to Gemini
                 return _get_gemini_insights(text_data, user_query)
         except HTTPException as e:
-            # If the primary AI provider fails, fall back to Gemini
-            if ai_provider != "gemini":
+            # If the primary AI provider fails, fall back to Gemini while budget remains
+            if ai_provider != "gemini" and not isinstance(e, DeadlineExceeded):
                 logger.warning(f"Falling back to Gemini AI after {ai_provider} failure")
                 return _get_gemini_insights(text_data, user_query)
             else:
                 raise
             
+    except HTTPException:
+        # Provider and deadline errors already carry the right status
+        raise
+    except psycopg2.errors.QueryCanceled:
+        logger.warning("Insights data query cancelled by request deadline")
+        raise DeadlineExceeded()
     except Exception as e:
         logger.error(f"Error generating insights: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate insights: {str(e)}")
\ No newline at end of file
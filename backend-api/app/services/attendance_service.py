@@ -6,21 +6,115 @@ import time
 from typing import Dict, List, Any, Optional
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import psycopg2
+import psycopg2.errors
 
 from app.models import AttendanceEntry
 from app.config import settings
+from app.deadline import DeadlineExceeded, apply_statement_timeout, stop_at_deadline, wait_for_deadline
+from app.services.change_feed import publish_change
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Define retry decorator for database operations
 db_retry = retry(
-    stop=stop_after_attempt(settings.DB_RETRY_ATTEMPTS),
-    wait=wait_exponential(multiplier=1, min=settings.DB_RETRY_MIN_SECONDS, max=settings.DB_RETRY_MAX_SECONDS),
+    stop=stop_after_attempt(settings.DB_RETRY_ATTEMPTS) | stop_at_deadline(),
+    wait=wait_for_deadline(
+        wait_exponential(multiplier=1, min=settings.DB_RETRY_MIN_SECONDS, max=settings.DB_RETRY_MAX_SECONDS)
+    ),
     retry=retry_if_exception_type((psycopg2.OperationalError, psycopg2.InterfaceError)),
     reraise=True
 )
 
+# In-process department name <-> id cache. Only ids read back from committed
+# rows are cached, so a rolled back insert can never leave a dangling id here.
+_department_ids: Dict[str, int] = {}
+_department_names: Dict[int, str] = {}
+
+def _cache_department(department_id: int, name: str) -> None:
+    """Record a department id/name pair in both directions"""
+    _department_ids[name] = department_id
+    _department_names[department_id] = name
+
+def _get_department_id(conn, name: str) -> int:
+    """
+    Resolve a department name to its id, creating the department if needed
+
+    Args:
+        conn: Database connection
+        name: Department name
+
+    Returns:
+        Department id
+    """
+    department_id = _department_ids.get(name)
+    if department_id is not None:
+        return department_id
+
+    apply_statement_timeout(conn)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM departments WHERE name = %s", (name,))
+    row = cursor.fetchone()
+    if row is not None:
+        _cache_department(row['id'], name)
+        return row['id']
+
+    # Not cached until a later lookup sees it committed
+    apply_statement_timeout(conn)
+    cursor.execute(
+        "INSERT INTO departments (name) VALUES (%s) ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name RETURNING id",
+        (name,)
+    )
+    return cursor.fetchone()['id']
+
+def _get_department_name(conn, department_id: int) -> str:
+    """
+    Resolve a department id to its name, reloading the cache on a miss
+
+    Args:
+        conn: Database connection
+        department_id: Department id
+
+    Returns:
+        Department name
+    """
+    name = _department_names.get(department_id)
+    if name is None:
+        apply_statement_timeout(conn)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, name FROM departments")
+        for row in cursor.fetchall():
+            _cache_department(row['id'], row['name'])
+        name = _department_names[department_id]
+    return name
+
+def _change_event(op: str, record_id: int, entry: AttendanceEntry, trend_deltas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Build a change feed event for a written attendance row
+
+    Args:
+        op: "insert" or "update"
+        record_id: ID of the attendance row
+        entry: AttendanceEntry that was written
+        trend_deltas: Per department/status count changes for the trends view
+
+    Returns:
+        JSON-serializable change event
+    """
+    return {
+        "op": op,
+        "employee_id": entry.employee_id,
+        "departments": sorted({entry.department} | {d["department"] for d in trend_deltas}),
+        "record": {
+            "id": record_id,
+            "employee_id": entry.employee_id,
+            "date": entry.date,
+            "status": entry.status,
+            "department": entry.department,
+        },
+        "trend_deltas": trend_deltas,
+    }
+
 @db_retry
 def add_attendance(conn, entry: AttendanceEntry) -> Dict[str, str]:
     """
@@ -35,17 +129,31 @@ def add_attendance(conn, entry: AttendanceEntry) -> Dict[str, str]:
         
     Raises:
         HTTPException: If there's an error adding the entry
+        DeadlineExceeded: If the request runs out of time
     """
     try:
+        department_id = _get_department_id(conn, entry.department)
+        apply_statement_timeout(conn)
         cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO attendance (employee_id, date, status, department) VALUES (%s, %s, %s, %s)",
-            (entry.employee_id, entry.date, entry.status, entry.department)
+            "INSERT INTO attendance (employee_id, date, status, department_id) VALUES (%s, %s, %s, %s) RETURNING id",
+            (entry.employee_id, entry.date, entry.status, department_id)
         )
+        record_id = cursor.fetchone()['id']
+        apply_statement_timeout(conn)
+        publish_change(conn, _change_event("insert", record_id, entry, [
+            {"department": entry.department, "status": entry.status, "delta": 1}
+        ]))
         return {"message": "Attendance added successfully"}
+    except psycopg2.errors.QueryCanceled:
+        logger.warning("Adding attendance cancelled by request deadline")
+        raise DeadlineExceeded()
     except psycopg2.IntegrityError as e:
         logger.error(f"Integrity error adding attendance: {str(e)}")
         raise HTTPException(status_code=409, detail=f"Attendance record already exists or violates constraints")
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
     except Exception as e:
         logger.error(f"Error adding attendance: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to add attendance: {str(e)}")
@@ -64,20 +172,45 @@ def update_attendance(conn, entry: AttendanceEntry) -> Dict[str, str]:
         
     Raises:
         HTTPException: If record not found or there's an error updating the entry
+        DeadlineExceeded: If the request runs out of time
     """
     try:
+        apply_statement_timeout(conn)
         cursor = conn.cursor()
         cursor.execute("""
-            UPDATE attendance
-            SET status = %s, department = %s
-            WHERE employee_id = %s AND date = %s
-        """, (entry.status, entry.department, entry.employee_id, entry.date))
+            SELECT a.id, a.status, d.name AS department
+            FROM attendance a JOIN departments d ON d.id = a.department_id
+            WHERE a.employee_id = %s AND a.date = %s
+            FOR UPDATE OF a
+        """, (entry.employee_id, entry.date))
+        previous_rows = cursor.fetchall()
         
-        if cursor.rowcount == 0:
+        if not previous_rows:
             logger.warning(f"No attendance record found for employee {entry.employee_id} on {entry.date}")
             raise HTTPException(status_code=404, detail="Attendance record not found")
         
+        # Only create the department once there is a row to point at it
+        department_id = _get_department_id(conn, entry.department)
+        apply_statement_timeout(conn)
+        cursor.execute(
+            "UPDATE attendance SET status = %s, department_id = %s WHERE id = ANY(%s)",
+            (entry.status, department_id, [row['id'] for row in previous_rows])
+        )
+        
+        for row in previous_rows:
+            previous_department = row['department']
+            if row['status'] == entry.status and previous_department == entry.department:
+                continue
+            apply_statement_timeout(conn)
+            publish_change(conn, _change_event("update", row['id'], entry, [
+                {"department": previous_department, "status": row['status'], "delta": -1},
+                {"department": entry.department, "status": entry.status, "delta": 1},
+            ]))
+        
         return {"message": "Attendance updated successfully"}
+    except psycopg2.errors.QueryCanceled:
+        logger.warning("Updating attendance cancelled by request deadline")
+        raise DeadlineExceeded()
     except psycopg2.IntegrityError as e:
         logger.error(f"Integrity error updating attendance: {str(e)}")
         raise HTTPException(status_code=409, detail=f"Update violates data constraints")
@@ -89,7 +222,7 @@ def update_attendance(conn, entry: AttendanceEntry) -> Dict[str, str]:
         raise HTTPException(status_code=500, detail=f"Failed to update attendance: {str(e)}")
 
 @db_retry
-def get_attendance_trends(conn) -> Dict[int, Dict[str, Any]]:
+def get_attendance_trends(conn) -> Dict[str, Any]:
     """
     Get attendance trends for all employees
     
@@ -97,30 +230,52 @@ def get_attendance_trends(conn) -> Dict[int, Dict[str, Any]]:
         conn: Database connection
         
     Returns:
-        Dict with employee attendance stats
+        Dict with per-employee attendance stats under "attendance_trends",
+        per-department status counts under "department_trends" (the same
+        aggregation change feed trend_deltas apply to), and the txid snapshot
+        both were read at under "snapshot", which change feed clients use to
+        skip deltas the stats already include
         
     Raises:
         HTTPException: If there's an error fetching the data
+        DeadlineExceeded: If the request runs out of time
     """
+    apply_statement_timeout(conn)
     try:
         cursor = conn.cursor()
-        cursor.execute(
-            "SELECT employee_id, department, status, COUNT(*) FROM attendance GROUP BY department, employee_id, status"
-        )
+        # The snapshot is read in the same statement so it matches the counts exactly
+        cursor.execute("""
+            SELECT employee_id, department_id, status, COUNT(*), txid_current_snapshot()::text AS snapshot
+            FROM attendance GROUP BY department_id, employee_id, status
+        """)
         records = cursor.fetchall()
         
         trends = {}
+        department_trends: Dict[str, Dict[str, int]] = {}
         for record in records:
             emp_id = record['employee_id']
-            department = record['department']
+            department = _get_department_name(conn, record['department_id'])
             status = record['status']
             count = record['count']
             
             if emp_id not in trends:
                 trends[emp_id] = {"department": department, "attendance": {}}
-            trends[emp_id]["attendance"][status] = count
+            # An employee can have rows in several departments, so sum rather than overwrite
+            attendance = trends[emp_id]["attendance"]
+            attendance[status] = attendance.get(status, 0) + count
             
-        return trends
+            department_counts = department_trends.setdefault(department, {})
+            department_counts[status] = department_counts.get(status, 0) + count
+        
+        # No rows means no committed writes to skip
+        snapshot = records[0]['snapshot'] if records else None
+        return {"attendance_trends": trends, "department_trends": department_trends, "snapshot": snapshot}
+    except psycopg2.errors.QueryCanceled:
+        logger.warning("Attendance trends query cancelled by request deadline")
+        raise DeadlineExceeded()
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
     except Exception as e:
         logger.error(f"Error getting attendance trends: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get attendance trends: {str(e)}")
@@ -139,14 +294,23 @@ def get_employee_attendance(conn, employee_id: int) -> List[Dict[str, Any]]:
         
     Raises:
         HTTPException: If there's an error fetching the data
+        DeadlineExceeded: If the request runs out of time
     """
+    apply_statement_timeout(conn)
     try:
         cursor = conn.cursor()
         cursor.execute(
-            "SELECT * FROM attendance WHERE employee_id = %s ORDER BY date DESC",
+            """
+            SELECT a.id, a.employee_id, a.date, a.status, d.name AS department
+            FROM attendance a JOIN departments d ON d.id = a.department_id
+            WHERE a.employee_id = %s ORDER BY a.date DESC
+            """,
             (employee_id,)
         )
         return cursor.fetchall()
+    except psycopg2.errors.QueryCanceled:
+        logger.warning("Employee attendance query cancelled by request deadline")
+        raise DeadlineExceeded()
     except Exception as e:
         logger.error(f"Error getting employee attendance: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get employee attendance: {str(e)}")
\ No newline at end of file
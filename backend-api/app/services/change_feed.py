@@ -0,0 +1,240 @@
+# app/services/change_feed.py
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional, Set
+
+import psycopg2
+import psycopg2.extensions
+
+from app.config import settings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CHANNEL = "attendance_changes"
+
+# Pre-encoded frame telling a client its delta stream is broken and it must re-fetch
+RESYNC_FRAME = "event: resync\ndata: {}\n\n"
+
+# TCP keepalives so a silently dropped LISTEN socket is noticed within about a minute
+LISTEN_KEEPALIVES = {
+    "keepalives": 1,
+    "keepalives_idle": 30,
+    "keepalives_interval": 10,
+    "keepalives_count": 3,
+}
+
+def publish_change(conn, event: Dict[str, Any]) -> None:
+    """
+    Publish an attendance change event through PostgreSQL NOTIFY
+
+    The notification is delivered to listeners in every worker only when the
+    surrounding transaction commits, so rolled back writes are never announced.
+    The writing transaction's id is added as "txid" so clients can compare the
+    event against the snapshot of data they already loaded.
+
+    Args:
+        conn: Database connection used for the write
+        event: JSON-serializable change event
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT pg_notify(%s, (%s::jsonb || jsonb_build_object('txid', txid_current()))::text)",
+        (CHANNEL, json.dumps(event, default=str))
+    )
+
+class Subscriber:
+    """A single change feed client with optional employee/department filters"""
+
+    def __init__(self, employee_id: Optional[int] = None, department: Optional[str] = None):
+        self.employee_id = employee_id
+        self.department = department
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.CHANGE_FEED_QUEUE_SIZE)
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        """Check whether an event passes this subscriber's filters"""
+        if self.employee_id is not None and event["employee_id"] != self.employee_id:
+            return False
+        if self.department is not None and self.department not in event["departments"]:
+            return False
+        return True
+
+class ChangeFeed:
+    """
+    Per-worker fan-out of attendance change notifications
+
+    A single LISTEN connection per worker receives every notification, which is
+    encoded once and handed to matching subscribers through bounded queues.
+    Subscribers are indexed by their most selective filter so that a change only
+    touches the subscribers that can possibly be interested in it.
+    """
+
+    def __init__(self):
+        self._conn = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped = False
+        self._by_employee: Dict[int, Set[Subscriber]] = {}
+        self._by_department: Dict[str, Set[Subscriber]] = {}
+        self._unfiltered: Set[Subscriber] = set()
+
+    def _bucket(self, subscriber: Subscriber) -> Set[Subscriber]:
+        if subscriber.employee_id is not None:
+            return self._by_employee.setdefault(subscriber.employee_id, set())
+        if subscriber.department is not None:
+            return self._by_department.setdefault(subscriber.department, set())
+        return self._unfiltered
+
+    def subscribe(self, employee_id: Optional[int] = None, department: Optional[str] = None) -> Subscriber:
+        """Register a new subscriber"""
+        subscriber = Subscriber(employee_id, department)
+        self._bucket(subscriber).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        """Remove a subscriber; safe to call more than once"""
+        bucket = self._bucket(subscriber)
+        bucket.discard(subscriber)
+        if not bucket:
+            if subscriber.employee_id is not None:
+                self._by_employee.pop(subscriber.employee_id, None)
+            elif subscriber.department is not None:
+                self._by_department.pop(subscriber.department, None)
+
+    @property
+    def subscriber_count(self) -> int:
+        return (
+            len(self._unfiltered)
+            + sum(len(s) for s in self._by_employee.values())
+            + sum(len(s) for s in self._by_department.values())
+        )
+
+    def _resync(self, subscriber: Subscriber) -> None:
+        """Drop a subscriber's pending deltas and tell it to re-fetch"""
+        self.unsubscribe(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(RESYNC_FRAME)
+
+    def dispatch(self, payload: str) -> None:
+        """Fan a raw notification payload out to matching subscribers"""
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Ignoring malformed change notification: {payload[:100]}")
+            return
+
+        candidates = set(self._unfiltered)
+        candidates.update(self._by_employee.get(event["employee_id"], ()))
+        for department in event["departments"]:
+            candidates.update(self._by_department.get(department, ()))
+        if not candidates:
+            return
+
+        frame = f"event: change\ndata: {payload}\n\n"
+        for subscriber in candidates:
+            if not subscriber.matches(event):
+                continue
+            try:
+                subscriber.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                logger.warning("Change feed subscriber fell behind; requesting resync")
+                self._resync(subscriber)
+
+    def _on_notify(self) -> None:
+        """Event loop reader callback for the LISTEN connection"""
+        try:
+            self._conn.poll()
+        except Exception as e:
+            logger.error(f"Change feed listener connection lost: {str(e)}")
+            self._disconnect()
+            self._resync_all()
+            self._schedule_reconnect()
+            return
+
+        while self._conn.notifies:
+            self.dispatch(self._conn.notifies.pop(0).payload)
+
+    def _resync_all(self) -> None:
+        subscribers = list(self._unfiltered)
+        for bucket in list(self._by_employee.values()) + list(self._by_department.values()):
+            subscribers.extend(bucket)
+        for subscriber in subscribers:
+            self._resync(subscriber)
+
+    @staticmethod
+    def _open_listen_connection():
+        """Open an autocommit connection listening on the change channel (blocking)"""
+        conn = psycopg2.connect(
+            settings.DATABASE_URL,
+            connect_timeout=settings.CHANGE_FEED_CONNECT_TIMEOUT_SECONDS,
+            **LISTEN_KEEPALIVES
+        )
+        try:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute(f"LISTEN {CHANNEL}")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    async def _connect(self) -> None:
+        # Connecting blocks on the network, so keep it off the event loop
+        conn = await self._loop.run_in_executor(None, self._open_listen_connection)
+        if self._stopped:
+            conn.close()
+            return
+        self._conn = conn
+        self._loop.add_reader(self._conn.fileno(), self._on_notify)
+        logger.info(f"Change feed listening on channel {CHANNEL}")
+
+    def _schedule_reconnect(self) -> None:
+        if self._stopped:
+            return
+        self._loop.call_later(
+            settings.CHANGE_FEED_RECONNECT_SECONDS,
+            lambda: self._loop.create_task(self._reconnect())
+        )
+
+    async def _reconnect(self) -> None:
+        if self._stopped:
+            return
+        try:
+            await self._connect()
+        except Exception as e:
+            logger.error(f"Failed to reconnect change feed listener: {str(e)}")
+            self._disconnect()
+            self._schedule_reconnect()
+            return
+
+        # Clients that re-subscribed while the listener was down may have
+        # missed notifications, so have them re-fetch once more
+        self._resync_all()
+
+    def _disconnect(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._loop.remove_reader(self._conn.fileno())
+        except Exception:
+            pass
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+    async def start(self) -> None:
+        """Start listening for change notifications on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._stopped = False
+        await self._connect()
+
+    def stop(self) -> None:
+        """Stop listening and tell connected clients to resync elsewhere"""
+        self._stopped = True
+        self._disconnect()
+        self._resync_all()
+
+# Change feed instance shared by the worker
+feed = ChangeFeed()
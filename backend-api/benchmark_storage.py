@@ -0,0 +1,70 @@
+# benchmark_storage.py
+"""
+Measure attendance table size and trends query time.
+
+Run once against the old schema, start the API (which migrates the table on
+startup), then run again to compare:
+
+    python benchmark_storage.py --runs 50
+"""
+import argparse
+import statistics
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from app.config import settings
+
+LEGACY_TRENDS_QUERY = (
+    "SELECT employee_id, department, status, COUNT(*) FROM attendance GROUP BY department, employee_id, status"
+)
+TRENDS_QUERY = (
+    "SELECT employee_id, department_id, status, COUNT(*) FROM attendance GROUP BY department_id, employee_id, status"
+)
+
+def main():
+    parser = argparse.ArgumentParser(description="Attendance storage benchmark")
+    parser.add_argument("--runs", type=int, default=20, help="Number of trends queries to time")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(settings.DATABASE_URL, cursor_factory=RealDictCursor)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'attendance' AND column_name = 'department'
+            """
+        )
+        legacy = cursor.fetchone() is not None
+        query = LEGACY_TRENDS_QUERY if legacy else TRENDS_QUERY
+
+        cursor.execute("""
+            SELECT COUNT(*) AS rows,
+                   pg_relation_size('attendance') AS table_bytes,
+                   pg_indexes_size('attendance') AS index_bytes,
+                   pg_total_relation_size('attendance') AS total_bytes
+            FROM attendance
+        """)
+        sizes = cursor.fetchone()
+
+        timings = []
+        for _ in range(args.runs):
+            start_time = time.perf_counter()
+            cursor.execute(query)
+            cursor.fetchall()
+            timings.append((time.perf_counter() - start_time) * 1000)
+
+        print(f"Schema:        {'legacy (VARCHAR department/status)' if legacy else 'normalized (department_id/enum status)'}")
+        print(f"Rows:          {sizes['rows']}")
+        print(f"Table size:    {sizes['table_bytes']} bytes")
+        print(f"Index size:    {sizes['index_bytes']} bytes")
+        print(f"Total size:    {sizes['total_bytes']} bytes")
+        print(f"Trends query:  median {statistics.median(timings):.2f}ms, "
+              f"min {min(timings):.2f}ms, max {max(timings):.2f}ms over {args.runs} runs")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,20 @@
 # main.py
 from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import uvicorn
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import asyncio
 import time
 import logging
 import traceback
 
 from app.config import settings
 from app.database import get_db, initialize_db
+from app.deadline import Deadline, get_deadline, set_deadline, reset_deadline, parse_request_timeout
 from app.models import AttendanceEntry, InsightsRequest
-from app.services import attendance_service, ai_service
+from app.services import attendance_service, ai_service, change_feed
 
 # Configure logging
 logging.basicConfig(
@@ -54,6 +57,49 @@ async def add_process_time_header(request: Request, call_next):
             content={"detail": "Internal server error", "error_type": type(e).__name__}
         )
 
+# Per-route default time budgets; streaming endpoints have no deadline
+ROUTE_TIMEOUTS = {
+    "/insights/": settings.INSIGHTS_TIMEOUT_SECONDS,
+}
+NO_DEADLINE_PATHS = {"/attendance/changes", "/health"}
+
+# How often to check whether the client is still connected
+DISCONNECT_POLL_SECONDS = 0.25
+
+# Add middleware that sets the request deadline from X-Request-Timeout or route defaults
+@app.middleware("http")
+async def set_request_deadline(request: Request, call_next):
+    if request.url.path in NO_DEADLINE_PATHS:
+        return await call_next(request)
+
+    try:
+        timeout = parse_request_timeout(
+            request.headers.get("X-Request-Timeout"),
+            ROUTE_TIMEOUTS.get(request.url.path, settings.REQUEST_TIMEOUT_SECONDS)
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+
+    token = set_deadline(Deadline(timeout))
+    try:
+        return await call_next(request)
+    finally:
+        reset_deadline(token)
+
+async def run_with_deadline(request: Request, func, *args):
+    """Run a blocking service call in the threadpool, cancelling its work if the client disconnects"""
+    deadline = get_deadline()
+    work = asyncio.ensure_future(run_in_threadpool(func, *args))
+    while deadline is not None and not deadline.cancelled:
+        done, _ = await asyncio.wait({work}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            break
+        if await request.is_disconnected():
+            logger.info(f"Client disconnected from {request.url.path}; cancelling request work")
+            # Sending a PostgreSQL cancel request opens a new connection, so keep it off the event loop
+            await run_in_threadpool(deadline.cancel)
+    return await work
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -69,36 +115,74 @@ async def global_exception_handler(request: Request, exc: Exception):
 async def startup_event():
     logger.info("Initializing database...")
     initialize_db()
+    await change_feed.feed.start()
     logger.info("API startup complete")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    change_feed.feed.stop()
+
 # API Endpoints
 @app.post("/attendance/", response_model=Dict[str, str])
-async def add_attendance(entry: AttendanceEntry, db=Depends(get_db)):
+async def add_attendance(request: Request, entry: AttendanceEntry, db=Depends(get_db)):
     """Add a new attendance entry to the database"""
-    return attendance_service.add_attendance(db, entry)
+    return await run_with_deadline(request, attendance_service.add_attendance, db, entry)
 
 @app.put("/attendance/", response_model=Dict[str, str])
-async def update_attendance(entry: AttendanceEntry, db=Depends(get_db)):
+async def update_attendance(request: Request, entry: AttendanceEntry, db=Depends(get_db)):
     """Update an existing attendance entry"""
-    return attendance_service.update_attendance(db, entry)
+    return await run_with_deadline(request, attendance_service.update_attendance, db, entry)
 
-@app.get("/attendance/trends", response_model=Dict[str, Dict])
-async def get_attendance_trends(db=Depends(get_db)):
+@app.get("/attendance/trends", response_model=Dict[str, Any])
+async def get_attendance_trends(request: Request, db=Depends(get_db)):
     """Get attendance trends across departments and employees"""
-    return {"attendance_trends": attendance_service.get_attendance_trends(db)}
+    return await run_with_deadline(request, attendance_service.get_attendance_trends, db)
+
+@app.get("/attendance/changes")
+async def stream_attendance_changes(
+    request: Request,
+    employee_id: Optional[int] = None,
+    department: Optional[str] = None
+):
+    """Stream attendance change events as Server-Sent Events, optionally filtered by employee or department"""
+    subscriber = change_feed.feed.subscribe(employee_id, department)
+
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    frame = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=settings.CHANGE_FEED_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield frame
+                if frame is change_feed.RESYNC_FRAME:
+                    break
+        finally:
+            change_feed.feed.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/attendance/{employee_id}", response_model=Dict[str, Any])
-async def get_attendance(employee_id: int, db=Depends(get_db)):
+async def get_attendance(request: Request, employee_id: int, db=Depends(get_db)):
     """Get attendance records for a specific employee"""
-    attendance = attendance_service.get_employee_attendance(db, employee_id)
+    attendance = await run_with_deadline(request, attendance_service.get_employee_attendance, db, employee_id)
     if not attendance:
         return {"message": "No attendance found for employee"}
     return {"attendance": attendance}
 
 @app.post("/insights/", response_model=Dict[str, str])
-async def get_insights(request: InsightsRequest, db=Depends(get_db)):
+async def get_insights(request: Request, insights_request: InsightsRequest, db=Depends(get_db)):
     """Get AI-generated insights from attendance data"""
-    return {"insights": ai_service.generate_insights(db, request.user_query)}
+    insights = await run_with_deadline(request, ai_service.generate_insights, db, insights_request.user_query)
+    return {"insights": insights}
 
 # Health check endpoint
 @app.get("/health")
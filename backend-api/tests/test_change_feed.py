@@ -0,0 +1,111 @@
+# tests/test_change_feed.py
+import json
+
+import pytest
+
+from app.config import settings
+from app.services.change_feed import RESYNC_FRAME, ChangeFeed
+
+def _payload(employee_id: int, *departments: str) -> str:
+    return json.dumps({
+        "op": "insert",
+        "employee_id": employee_id,
+        "departments": list(departments),
+        "record": {},
+        "trend_deltas": [],
+        "txid": 1,
+    })
+
+def _frames(subscriber):
+    frames = []
+    while not subscriber.queue.empty():
+        frames.append(subscriber.queue.get_nowait())
+    return frames
+
+def test_dispatch_delivers_to_unfiltered_subscriber():
+    feed = ChangeFeed()
+    subscriber = feed.subscribe()
+    payload = _payload(1, "Sales")
+
+    feed.dispatch(payload)
+
+    assert _frames(subscriber) == [f"event: change\ndata: {payload}\n\n"]
+
+def test_dispatch_filters_by_employee():
+    feed = ChangeFeed()
+    matching = feed.subscribe(employee_id=1)
+    other = feed.subscribe(employee_id=2)
+
+    feed.dispatch(_payload(1, "Sales"))
+
+    assert len(_frames(matching)) == 1
+    assert _frames(other) == []
+
+def test_dispatch_matches_any_event_department():
+    feed = ChangeFeed()
+    previous = feed.subscribe(department="HR")
+    current = feed.subscribe(department="Sales")
+    unrelated = feed.subscribe(department="Finance")
+
+    # An update moving a row from HR to Sales concerns both departments
+    feed.dispatch(_payload(1, "HR", "Sales"))
+
+    assert len(_frames(previous)) == 1
+    assert len(_frames(current)) == 1
+    assert _frames(unrelated) == []
+
+def test_dispatch_requires_all_filters_to_match():
+    feed = ChangeFeed()
+    subscriber = feed.subscribe(employee_id=1, department="HR")
+
+    feed.dispatch(_payload(1, "Sales"))
+    feed.dispatch(_payload(2, "HR"))
+    feed.dispatch(_payload(1, "HR"))
+
+    assert len(_frames(subscriber)) == 1
+
+def test_dispatch_ignores_malformed_payload():
+    feed = ChangeFeed()
+    subscriber = feed.subscribe()
+
+    feed.dispatch("not json")
+
+    assert _frames(subscriber) == []
+
+def test_slow_subscriber_is_resynced(monkeypatch):
+    monkeypatch.setattr(settings, "CHANGE_FEED_QUEUE_SIZE", 2)
+    feed = ChangeFeed()
+    slow = feed.subscribe()
+
+    for _ in range(3):
+        feed.dispatch(_payload(1, "Sales"))
+
+    # Pending deltas are dropped in favour of a single resync, and the
+    # subscriber no longer receives events
+    assert _frames(slow) == [RESYNC_FRAME]
+    assert feed.subscriber_count == 0
+    feed.dispatch(_payload(1, "Sales"))
+    assert _frames(slow) == []
+
+def test_resync_all_notifies_every_subscriber():
+    feed = ChangeFeed()
+    subscribers = [feed.subscribe(), feed.subscribe(employee_id=1), feed.subscribe(department="HR")]
+
+    feed._resync_all()
+
+    for subscriber in subscribers:
+        assert _frames(subscriber) == [RESYNC_FRAME]
+    assert feed.subscriber_count == 0
+
+@pytest.mark.parametrize("filters", [{}, {"employee_id": 1}, {"department": "HR"}])
+def test_unsubscribe_is_idempotent_and_cleans_up_index(filters):
+    feed = ChangeFeed()
+    subscriber = feed.subscribe(**filters)
+    assert feed.subscriber_count == 1
+
+    feed.unsubscribe(subscriber)
+    feed.unsubscribe(subscriber)
+
+    assert feed.subscriber_count == 0
+    assert feed._by_employee == {}
+    assert feed._by_department == {}
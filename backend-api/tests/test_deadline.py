@@ -0,0 +1,120 @@
+# tests/test_deadline.py
+import time
+
+import pytest
+from tenacity import retry, stop_after_attempt, wait_fixed
+
+from app.config import settings
+from app.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    parse_request_timeout,
+    reset_deadline,
+    set_deadline,
+    stop_at_deadline,
+    wait_for_deadline,
+)
+
+@pytest.fixture
+def deadline():
+    """Install a deadline for the duration of a test"""
+    tokens = []
+
+    def install(timeout: float) -> Deadline:
+        current = Deadline(timeout)
+        tokens.append(set_deadline(current))
+        return current
+
+    yield install
+    for token in reversed(tokens):
+        reset_deadline(token)
+
+def test_parse_request_timeout_uses_default_without_header():
+    assert parse_request_timeout(None, 7.0) == 7.0
+
+def test_parse_request_timeout_accepts_header():
+    assert parse_request_timeout("2.5", 7.0) == 2.5
+
+def test_parse_request_timeout_caps_at_maximum():
+    assert parse_request_timeout("100000", 7.0) == settings.REQUEST_TIMEOUT_MAX_SECONDS
+
+@pytest.mark.parametrize("header", ["abc", "", "0", "-1", "nan", "inf", "-inf"])
+def test_parse_request_timeout_rejects_invalid_values(header):
+    with pytest.raises(ValueError):
+        parse_request_timeout(header, 7.0)
+
+def test_deadline_check_raises_when_expired():
+    expired = Deadline(0)
+    with pytest.raises(DeadlineExceeded) as exc_info:
+        expired.check()
+    assert exc_info.value.status_code == 504
+
+def test_deadline_cancel_exhausts_budget_and_cancels_connections():
+    class FakeConnection:
+        cancelled = False
+
+        def cancel(self):
+            self.cancelled = True
+
+    conn = FakeConnection()
+    current = Deadline(60)
+    current.track(conn)
+    current.cancel()
+
+    assert conn.cancelled
+    assert current.remaining() == 0
+    with pytest.raises(DeadlineExceeded):
+        current.check()
+
+def test_stop_at_deadline_without_deadline_never_stops():
+    assert stop_at_deadline()(None) is False
+
+def test_stop_at_deadline_stops_when_budget_too_small(deadline):
+    deadline(settings.DEADLINE_MIN_ATTEMPT_SECONDS / 2)
+    assert stop_at_deadline()(None) is True
+
+def test_stop_at_deadline_continues_with_budget_left(deadline):
+    deadline(60)
+    assert stop_at_deadline()(None) is False
+
+def test_wait_for_deadline_without_deadline_keeps_delay():
+    assert wait_for_deadline(wait_fixed(5))(None) == 5
+
+def test_wait_for_deadline_trims_delay_to_leave_room_for_attempt(deadline):
+    deadline(2)
+    delay = wait_for_deadline(wait_fixed(5))(None)
+    assert 0 < delay <= 2 - settings.DEADLINE_MIN_ATTEMPT_SECONDS
+
+def test_wait_for_deadline_never_negative(deadline):
+    deadline(0)
+    assert wait_for_deadline(wait_fixed(5))(None) == 0
+
+def test_retry_gives_up_within_deadline(deadline):
+    attempts = []
+
+    @retry(
+        stop=stop_after_attempt(5) | stop_at_deadline(),
+        wait=wait_for_deadline(wait_fixed(10)),
+        reraise=True
+    )
+    def always_fails():
+        attempts.append(time.monotonic())
+        raise RuntimeError("boom")
+
+    deadline(1)
+    start = time.monotonic()
+    with pytest.raises(RuntimeError):
+        always_fails()
+
+    assert time.monotonic() - start < 1.5
+    assert len(attempts) == 2
+
+@pytest.mark.parametrize("header", ["abc", "nan", "0"])
+def test_invalid_request_timeout_header_is_rejected(header):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    # Rejected by the deadline middleware before any database access
+    response = TestClient(app).get("/attendance/trends", headers={"X-Request-Timeout": header})
+
+    assert response.status_code == 400
@@ -1,5 +1,5 @@
 
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { toast } from "sonner";
 import { Card, CardContent } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
@@ -8,6 +8,7 @@ import { RefreshCw } from "lucide-react";
 
 interface AttendanceTrendsProps {
   apiUrl: string;
+  changesUrl: string;
 }
 
 interface TrendData {
@@ -17,11 +18,44 @@ interface TrendData {
   WFH: number;
 }
 
-export default function AttendanceTrends({ apiUrl }: AttendanceTrendsProps) {
+interface TrendDelta {
+  department: string;
+  status: "Present" | "Absent" | "WFH";
+  delta: number;
+}
+
+interface AttendanceChange {
+  txid: number;
+  trend_deltas: TrendDelta[];
+}
+
+// Whether a transaction is already included in a txid_current_snapshot() ("xmin:xmax:xip,...")
+const isInSnapshot = (txid: number, snapshot: string | null) => {
+  if (!snapshot) {
+    return false;
+  }
+  const [xmin, xmax, xip] = snapshot.split(":");
+  if (txid < Number(xmin)) {
+    return true;
+  }
+  if (txid >= Number(xmax)) {
+    return false;
+  }
+  return !xip.split(",").filter(Boolean).map(Number).includes(txid);
+};
+
+export default function AttendanceTrends({ apiUrl, changesUrl }: AttendanceTrendsProps) {
   const [isLoading, setIsLoading] = useState(true);
   const [trends, setTrends] = useState<TrendData[]>([]);
+  // Snapshot the current trends were read at, used to skip deltas they already include
+  const snapshotRef = useRef<string | null>(null);
+  // Changes received while a snapshot is loading; null when no load is in flight
+  const pendingRef = useRef<AttendanceChange[] | null>(null);
+  const fetchIdRef = useRef(0);
 
   const fetchTrends = async () => {
+    const fetchId = ++fetchIdRef.current;
+    pendingRef.current = pendingRef.current ?? [];
     try {
       setIsLoading(true);
       const response = await fetch(apiUrl);
@@ -31,47 +65,92 @@ export default function AttendanceTrends({ apiUrl }: AttendanceTrendsProps) {
       }
       
       const data = await response.json();
+      if (fetchId !== fetchIdRef.current) {
+        // A newer load has started and will apply the buffered changes
+        return;
+      }
       
-      // Process data for chart visualization
-      if (data.attendance_trends) {
-        const departmentTrends: { [key: string]: TrendData } = {};
+      // Process data for chart visualization. Per-department counts are the same
+      // aggregation the pushed trend deltas apply to, so the two never drift apart.
+      if (data.department_trends) {
+        const departmentTrends: TrendData[] = Object.entries(data.department_trends).map(
+          ([department, counts]: [string, any]) => ({
+            name: department,
+            Present: counts.Present ?? 0,
+            Absent: counts.Absent ?? 0,
+            WFH: counts.WFH ?? 0
+          })
+        );
         
-        // Group by department
-        Object.values(data.attendance_trends).forEach((entry: any) => {
-          const department = entry.department;
-          if (!departmentTrends[department]) {
-            departmentTrends[department] = {
-              name: department,
-              Present: 0,
-              Absent: 0,
-              WFH: 0
-            };
-          }
-          
-          // Add up the counts
-          if (entry.attendance.Present) {
-            departmentTrends[department].Present += entry.attendance.Present;
-          }
-          if (entry.attendance.Absent) {
-            departmentTrends[department].Absent += entry.attendance.Absent;
-          }
-          if (entry.attendance.WFH) {
-            departmentTrends[department].WFH += entry.attendance.WFH;
-          }
-        });
-        
-        setTrends(Object.values(departmentTrends));
+        setTrends(departmentTrends);
+        snapshotRef.current = data.snapshot ?? null;
       }
+      
+      const pending = pendingRef.current ?? [];
+      pendingRef.current = null;
+      pending.forEach(applyChange);
     } catch (error) {
       toast.error(error instanceof Error ? error.message : "Failed to fetch attendance trends");
+      if (fetchId === fetchIdRef.current) {
+        pendingRef.current = null;
+      }
     } finally {
-      setIsLoading(false);
+      if (fetchId === fetchIdRef.current) {
+        setIsLoading(false);
+      }
+    }
+  };
+
+  const applyTrendDeltas = (deltas: TrendDelta[]) => {
+    setTrends((current) => {
+      const departmentTrends: { [key: string]: TrendData } = {};
+      current.forEach((trend) => {
+        departmentTrends[trend.name] = { ...trend };
+      });
+      
+      deltas.forEach(({ department, status, delta }) => {
+        if (!departmentTrends[department]) {
+          departmentTrends[department] = { name: department, Present: 0, Absent: 0, WFH: 0 };
+        }
+        departmentTrends[department][status] += delta;
+      });
+      
+      return Object.values(departmentTrends);
+    });
+  };
+
+  const applyChange = (change: AttendanceChange) => {
+    if (pendingRef.current) {
+      pendingRef.current.push(change);
+    } else if (!isInSnapshot(change.txid, snapshotRef.current)) {
+      applyTrendDeltas(change.trend_deltas);
     }
   };
 
+  // Load trends directly so the chart works even if the change feed never opens,
+  // then apply pushed deltas instead of re-fetching the whole trends payload
   useEffect(() => {
     fetchTrends();
-  }, [apiUrl]);
+    
+    const source = new EventSource(changesUrl);
+    
+    source.addEventListener("change", (event) => {
+      applyChange(JSON.parse((event as MessageEvent).data));
+    });
+    // Deltas committed before the subscription opened (including after a
+    // reconnect or resync) are never pushed, so reload the snapshot on open
+    source.onopen = () => {
+      fetchTrends();
+    };
+    source.onerror = () => {
+      // Keep showing the last loaded trends while the feed is unavailable
+      if (!pendingRef.current) {
+        setIsLoading(false);
+      }
+    };
+    
+    return () => source.close();
+  }, [apiUrl, changesUrl]);
 
   if (isLoading) {
     return (
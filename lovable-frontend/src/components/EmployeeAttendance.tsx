@@ -1,5 +1,5 @@
 
-import { useState } from "react";
+import { useState, useEffect, useRef } from "react";
 import { toast } from "sonner";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
@@ -10,6 +10,7 @@ import { SearchIcon } from "lucide-react";
 
 interface EmployeeAttendanceProps {
   apiUrl: string;
+  changesUrl: string;
 }
 
 interface AttendanceRecord {
@@ -20,44 +21,116 @@ interface AttendanceRecord {
   department: string;
 }
 
-export default function EmployeeAttendance({ apiUrl }: EmployeeAttendanceProps) {
+export default function EmployeeAttendance({ apiUrl, changesUrl }: EmployeeAttendanceProps) {
   const [employeeId, setEmployeeId] = useState("");
+  const [subscribedEmployeeId, setSubscribedEmployeeId] = useState<string | null>(null);
   const [isLoading, setIsLoading] = useState(false);
   const [attendanceData, setAttendanceData] = useState<AttendanceRecord[] | null>(null);
   const [noDataMessage, setNoDataMessage] = useState<string | null>(null);
 
-  const fetchAttendance = async () => {
-    if (!employeeId.trim()) {
-      toast.error("Please enter an employee ID");
-      return;
-    }
+  // Records received while a load is in flight; null when no load is in flight
+  const pendingRef = useRef<AttendanceRecord[] | null>(null);
+  const fetchIdRef = useRef(0);
+  // Employee whose records are displayed, so changes for a previous one are ignored
+  const displayedIdRef = useRef<string | null>(null);
 
+  const loadAttendance = async (id: string) => {
+    const fetchId = ++fetchIdRef.current;
+    if (displayedIdRef.current !== id) {
+      displayedIdRef.current = id;
+      pendingRef.current = [];
+    } else {
+      pendingRef.current = pendingRef.current ?? [];
+    }
     try {
       setIsLoading(true);
       setNoDataMessage(null);
       
-      const response = await fetch(`${apiUrl}${employeeId}`);
+      const response = await fetch(`${apiUrl}${id}`);
       const data = await response.json();
+      if (fetchId !== fetchIdRef.current) {
+        // A newer load has started and will apply the buffered changes
+        return;
+      }
       
       if (data.message === "No attendance found for employee") {
         setAttendanceData(null);
         setNoDataMessage("No attendance records found for this employee");
-        return;
-      }
-      
-      if (data.attendance && Array.isArray(data.attendance)) {
+      } else if (data.attendance && Array.isArray(data.attendance)) {
         setAttendanceData(data.attendance);
       } else {
         throw new Error("Invalid data format");
       }
+      
+      // Changes pushed while loading may be newer than the loaded records
+      const pending = pendingRef.current ?? [];
+      pendingRef.current = null;
+      pending.forEach(applyRecordChange);
     } catch (error) {
+      if (fetchId !== fetchIdRef.current) {
+        return;
+      }
+      pendingRef.current = null;
       toast.error(error instanceof Error ? error.message : "Failed to fetch attendance data");
       setAttendanceData(null);
     } finally {
-      setIsLoading(false);
+      if (fetchId === fetchIdRef.current) {
+        setIsLoading(false);
+      }
+    }
+  };
+
+  const fetchAttendance = () => {
+    if (!employeeId.trim()) {
+      toast.error("Please enter an employee ID");
+      return;
+    }
+
+    loadAttendance(employeeId);
+    setSubscribedEmployeeId(employeeId);
+  };
+
+  const applyRecordChange = (record: AttendanceRecord) => {
+    if (String(record.employee_id) !== displayedIdRef.current) {
+      return;
+    }
+    if (pendingRef.current) {
+      pendingRef.current.push(record);
+      return;
     }
+    setNoDataMessage(null);
+    setAttendanceData((current) => {
+      const records = (current ?? []).filter((existing) => existing.id !== record.id);
+      return [...records, record].sort((a, b) => b.date.localeCompare(a.date));
+    });
   };
 
+  // Keep the displayed employee's records current from the change feed
+  useEffect(() => {
+    if (!subscribedEmployeeId) {
+      return;
+    }
+    
+    const source = new EventSource(`${changesUrl}?employee_id=${subscribedEmployeeId}`);
+    source.addEventListener("change", (event) => {
+      const change = JSON.parse((event as MessageEvent).data);
+      applyRecordChange(change.record);
+    });
+    // Changes committed before the subscription opened (including after a
+    // resync or network drop) are never pushed, so reload on every open
+    source.onopen = () => {
+      loadAttendance(subscribedEmployeeId);
+    };
+    source.onerror = () => {
+      // Keep showing the last loaded records while the feed is unavailable
+      if (!pendingRef.current) {
+        setIsLoading(false);
+      }
+    };
+
+    return () => source.close();
+  }, [apiUrl, changesUrl, subscribedEmployeeId]);
+
   return (
     <div className="space-y-4">
       <div className="flex flex-col md:flex-row gap-4">
@@ -108,16 +181,16 @@ export default function EmployeeAttendance({ apiUrl }: EmployeeAttendanceProps)
             <TableBody>
               {attendanceData.map((record) => (
                 <TableRow key={record.id}>
-                  <TableCell>{record[2]}</TableCell> {/* Date is at index 2 in the tuple */}
+                  <TableCell>{record.date}</TableCell>
                   <TableCell>
                     <span className={`inline-flex items-center px-2.5 py-0.5 rounded-full text-xs font-medium
-                      ${record[3] === 'Present' ? 'bg-green-100 text-green-800 dark:bg-green-900 dark:text-green-300' : 
-                      record[3] === 'Absent' ? 'bg-red-100 text-red-800 dark:bg-red-900 dark:text-red-300' : 
+                      ${record.status === 'Present' ? 'bg-green-100 text-green-800 dark:bg-green-900 dark:text-green-300' : 
+                      record.status === 'Absent' ? 'bg-red-100 text-red-800 dark:bg-red-900 dark:text-red-300' : 
                       'bg-blue-100 text-blue-800 dark:bg-blue-900 dark:text-blue-300'}`}>
-                      {record[3]}
+                      {record.status}
                     </span>
                   </TableCell>
-                  <TableCell>{record[4]}</TableCell> {/* Department is at index 4 in the tuple */}
+                  <TableCell>{record.department}</TableCell>
                 </TableRow>
               ))}
             </TableBody>
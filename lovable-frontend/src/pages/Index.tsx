@@ -64,7 +64,10 @@ const Index = () => {
                 <CardDescription>View attendance records for a specific employee</CardDescription>
               </CardHeader>
               <CardContent>
-                <EmployeeAttendance apiUrl={`${API_BASE_URL}/attendance/`} />
+                <EmployeeAttendance
+                  apiUrl={`${API_BASE_URL}/attendance/`}
+                  changesUrl={`${API_BASE_URL}/attendance/changes`}
+                />
               </CardContent>
             </Card>
           </TabsContent>
@@ -76,7 +79,10 @@ const Index = () => {
                 <CardDescription>View attendance trends across departments</CardDescription>
               </CardHeader>
               <CardContent>
-                <AttendanceTrends apiUrl={`${API_BASE_URL}/attendance/trends`} />
+                <AttendanceTrends
+                  apiUrl={`${API_BASE_URL}/attendance/trends`}
+                  changesUrl={`${API_BASE_URL}/attendance/changes`}
+                />
               </CardContent>
             </Card>
           </TabsContent>